@@ -1,39 +1,118 @@
+from __future__ import annotations
+
 import asyncio
+import bisect
+import copy
 import csv
+import hashlib
+import importlib
 import json
 import os
+import queue
+import random
 import sqlite3
 import sys
 import threading
 import time
-from typing import Dict, List, NoReturn, Union
-import pandas as pd
-import ccxt
-from flask import Flask, jsonify, request
-from dotenv import load_dotenv
+import weakref
+from typing import TYPE_CHECKING, Callable, Dict, List, NoReturn, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import ccxt.async_support as ccxt
+
+
+class LazyModule:
+    """Imports a module on first attribute access instead of at import time."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
 
-# Load environment variables
-load_dotenv()
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# Heavy dependencies: ccxt is only needed once the exchange is built, pandas
+# only for the OHLCV/backtest helpers.
+if not TYPE_CHECKING:
+    ccxt = LazyModule("ccxt.async_support")
+    pd = LazyModule("pandas")
 
 # --- Settings ---
-app = Flask(__name__)
 DATABASE = "trading_history.db"
-AUTH_ID = os.getenv("AUTH_ID")
-TEST_MODE = os.getenv("TEST_MODE", "true").lower() == "true"
-EXCHANGE_ID = os.getenv("EXCHANGE", "phemex").lower()
-TICKER_BASE = os.getenv("TICKER_BASE")
-TICKER_QUOTE = os.getenv("TICKER_QUOTE")
-TICKER = f"{TICKER_BASE}/{TICKER_QUOTE}"
-LEVERAGE = float(os.getenv("LEVERAGE", 1))
-
-TRAILING_STOP_PERCENT = float(os.getenv("TRAILING_STOP_PERCENT", 0.02))  # 2%
-EMERGENCY_EXIT_PERCENT = float(os.getenv("EMERGENCY_EXIT_PERCENT", 0.05))  # 5%
-TRAILING_STOP_TYPE = os.getenv(
-    "TRAILING_STOP_TYPE", "ByMarkPrice"
-)  # "ByMarkPrice" or "ByLastPrice"
+ANALYTICS_DATABASE = "trading_analytics.db"
+AUTH_ID = None
+TEST_MODE = True
+EXCHANGE_ID = "phemex"
+TICKER_BASE = None
+TICKER_QUOTE = None
+TICKER = None
+LEVERAGE = 1.0
+
+TRAILING_STOP_PERCENT = 0.02  # 2%
+EMERGENCY_EXIT_PERCENT = 0.05  # 5%
+TRAILING_STOP_TYPE = "ByMarkPrice"  # "ByMarkPrice" or "ByLastPrice"
+TAKE_PROFIT_PERCENT = None  # No take-profit order unless set
 MAX_RETRIES = 3
+BREAKER_THRESHOLD = 5  # Consecutive network errors before an endpoint is cut off
+BREAKER_RESET_SECONDS = 30.0
+RETRY_BUDGET_RATIO = 0.2  # Retries and hedges allowed per normal call
+HEDGE_MIN_DELAY = 0.25  # Seconds before a slow read may be hedged
+MAX_BACKOFF = 30.0  # Longest wait between retries, in seconds
+WORKERS = 0  # Local worker processes; 0 runs everything in this process
+WORKER_ADDRESSES: List[str] = []  # Remote workers, as "host:port"
+HEALTH_CHECK_SECONDS = 5.0
+
+
+def load_settings():
+    """Loads settings from the environment (and `.env`, if present)."""
+    global DATABASE, ANALYTICS_DATABASE, AUTH_ID, TEST_MODE, EXCHANGE_ID
+    global TICKER_BASE, TICKER_QUOTE
+    global TICKER, LEVERAGE, TRAILING_STOP_PERCENT, EMERGENCY_EXIT_PERCENT
+    global TRAILING_STOP_TYPE, TAKE_PROFIT_PERCENT
+    global WORKERS, WORKER_ADDRESSES, HEALTH_CHECK_SECONDS
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    DATABASE = os.getenv("DATABASE") or "trading_history.db"
+    ANALYTICS_DATABASE = os.getenv("ANALYTICS_DATABASE") or "trading_analytics.db"
+    AUTH_ID = os.getenv("AUTH_ID")
+    TEST_MODE = os.getenv("TEST_MODE", "true").lower() == "true"
+    EXCHANGE_ID = os.getenv("EXCHANGE", "phemex").lower()
+    TICKER_BASE = os.getenv("TICKER_BASE")
+    TICKER_QUOTE = os.getenv("TICKER_QUOTE")
+    TICKER = f"{TICKER_BASE}/{TICKER_QUOTE}"
+    LEVERAGE = float(os.getenv("LEVERAGE", 1))
+    TRAILING_STOP_PERCENT = float(os.getenv("TRAILING_STOP_PERCENT", 0.02))
+    EMERGENCY_EXIT_PERCENT = float(os.getenv("EMERGENCY_EXIT_PERCENT", 0.05))
+    TRAILING_STOP_TYPE = os.getenv("TRAILING_STOP_TYPE", "ByMarkPrice")
+    if os.getenv("TAKE_PROFIT_PERCENT"):
+        TAKE_PROFIT_PERCENT = float(os.getenv("TAKE_PROFIT_PERCENT"))
+    WORKERS = int(os.getenv("WORKERS", 0))
+    WORKER_ADDRESSES = [
+        a.strip() for a in os.getenv("WORKER_ADDRESSES", "").split(",") if a.strip()
+    ]
+    HEALTH_CHECK_SECONDS = float(os.getenv("HEALTH_CHECK_SECONDS", 5))
+
 
 # --- Database Functions ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp INTEGER NOT NULL,
+    account TEXT,
+    action TEXT,
+    order_type TEXT,
+    symbol TEXT,
+    price REAL,
+    amount REAL,
+    fees TEXT,
+    status TEXT
+);
+"""
 
 
 def get_db():
@@ -44,61 +123,714 @@ def get_db():
 
 
 def init_db():
-    with app.app_context():
-        db = get_db()
+    db = get_db()
+    db.executescript(SCHEMA)
+    db.commit()
+    db.close()
+
+
+# --- Accounts ---
+class Account:
+    """One exchange account: its own client, rate limiter and position state."""
+
+    def __init__(
+        self,
+        name: str,
+        exchange_id: str,
+        api_key: str,
+        secret: str,
+        ticker_base: str,
+        ticker_quote: str,
+        leverage: float,
+    ):
+        self.name = name
+        self.exchange_id = exchange_id
+        self.api_key = api_key
+        self.secret = secret
+        self.ticker_base = ticker_base
+        self.ticker_quote = ticker_quote
+        self.symbol = f"{ticker_base}/{ticker_quote}"
+        self.leverage = leverage
+        self.exchange: ccxt.Exchange = None  # Built by `init_exchanges`
+        self.positions: Dict = {}
+        self.lock = asyncio.Lock()  # Held while a signal changes positions
+
+
+def load_accounts() -> Dict[str, Account]:
+    """Reads the accounts listed in `ACCOUNTS` (comma separated).
+
+    Each account is configured with `ACCOUNT_<NAME>_EXCHANGE`,
+    `ACCOUNT_<NAME>_API_KEY`, `ACCOUNT_<NAME>_API_SECRET` (`_TESTNET_API_KEY`
+    and `_TESTNET_API_SECRET` in test mode), `ACCOUNT_<NAME>_TICKER_BASE`,
+    `ACCOUNT_<NAME>_TICKER_QUOTE` and `ACCOUNT_<NAME>_LEVERAGE`, falling back
+    to the global settings. Without `ACCOUNTS`, a single `default` account is
+    built from the global settings and `[EXCHANGE_ID]_API_KEY` keys.
+    """
+    key_suffix = "_TESTNET_API_KEY" if TEST_MODE else "_API_KEY"
+    secret_suffix = "_TESTNET_API_SECRET" if TEST_MODE else "_API_SECRET"
+    names = [n.strip() for n in os.getenv("ACCOUNTS", "").split(",") if n.strip()]
+    if not names:
+        return {
+            "default": Account(
+                "default",
+                EXCHANGE_ID,
+                os.getenv(f"{EXCHANGE_ID.upper()}{key_suffix}"),
+                os.getenv(f"{EXCHANGE_ID.upper()}{secret_suffix}"),
+                TICKER_BASE,
+                TICKER_QUOTE,
+                LEVERAGE,
+            )
+        }
+
+    accounts = {}
+    for name in names:
+        prefix = f"ACCOUNT_{name.upper()}"
+        accounts[name] = Account(
+            name,
+            os.getenv(f"{prefix}_EXCHANGE", EXCHANGE_ID).lower(),
+            os.getenv(f"{prefix}{key_suffix}"),
+            os.getenv(f"{prefix}{secret_suffix}"),
+            os.getenv(f"{prefix}_TICKER_BASE", TICKER_BASE),
+            os.getenv(f"{prefix}_TICKER_QUOTE", TICKER_QUOTE),
+            float(os.getenv(f"{prefix}_LEVERAGE", LEVERAGE)),
+        )
+    return accounts
+
+
+# --- Global State ---
+accounts: Dict[str, Account] = {}
+market_data: Dict[str, ccxt.Exchange] = {}  # Shared public client per exchange
+markets_ready: asyncio.Event = None
+last_prices: Dict = {}  # Keyed by (exchange_id, symbol)
+
+
+def get_account(name: str = None) -> Account:
+    """Returns the named account, or the first configured one."""
+    if name is None:
+        return next(iter(accounts.values()))
+    return accounts.get(name)
+
+
+# --- Lifecycle ---
+_startup_hooks: List[Callable] = []
+_shutdown_hooks: List[Callable] = []
+
+
+def on_startup(func: Callable) -> Callable:
+    """Registers a coroutine function to run when the bot starts."""
+    _startup_hooks.append(func)
+    return func
+
+
+def on_shutdown(func: Callable) -> Callable:
+    """Registers a coroutine function to run when the bot stops."""
+    _shutdown_hooks.append(func)
+    return func
+
+
+async def startup():
+    for hook in _startup_hooks:
+        await hook()
+
+
+async def shutdown():
+    for hook in reversed(_shutdown_hooks):
         try:
-            with app.open_resource("schema.sql", mode="r") as f:
-                db.cursor().executescript(f.read())
-        except:
-            pass
-        db.commit()
-        db.close()
+            await hook()
+        except Exception as e:
+            handle_exception(e)
 
 
-# Initialize the database
-init_db()
+@on_startup
+async def init_storage():
+    init_db()
 
-# --- Exchange Setup ---
-exchange_class = getattr(ccxt, EXCHANGE_ID)
-exchange = exchange_class(
-    {
-        "apiKey": os.getenv(
-            f"{EXCHANGE_ID.upper()}_TESTNET_API_KEY"
-            if TEST_MODE
-            else f"{EXCHANGE_ID.upper()}_API_KEY"
-        ),
-        "secret": os.getenv(
-            f"{EXCHANGE_ID.upper()}_TESTNET_API_SECRET"
-            if TEST_MODE
-            else f"{EXCHANGE_ID.upper()}_API_SECRET"
-        ),
-        "enableRateLimit": True,
-        "timeout": 30000,
-    }
+
+def build_exchange(exchange_id: str, api_key: str = None, secret: str = None):
+    exchange_class = getattr(ccxt, exchange_id)
+    exchange = exchange_class(
+        {
+            "apiKey": api_key,
+            "secret": secret,
+            "enableRateLimit": True,
+            "timeout": 30000,
+        }
+    )
+    if TEST_MODE:
+        if hasattr(exchange, "urls") and "test" in exchange.urls:
+            exchange.urls["api"] = exchange.urls["test"]
+    return exchange
+
+
+@on_startup
+async def init_exchanges():
+    """Builds the exchange clients and loads markets in the background.
+
+    Every account gets its own client, so ccxt rate limits each account
+    separately. Markets and tickers come from one public client per exchange
+    id, shared by all accounts on that exchange.
+    """
+    global accounts, markets_ready
+    accounts = load_accounts()
+    for account in accounts.values():
+        if account.exchange_id not in market_data:
+            market_data[account.exchange_id] = build_exchange(account.exchange_id)
+        account.exchange = build_exchange(
+            account.exchange_id, account.api_key, account.secret
+        )
+        mode = "TESTING" if TEST_MODE else "LIVE"
+        print(f"Currently {mode} on {account.exchange_id} ({account.name})")
+
+    markets_ready = asyncio.Event()
+    asyncio.get_running_loop().create_task(load_markets())
+
+
+async def load_markets():
+    async def load(exchange_id: str, public: ccxt.Exchange):
+        attempt = 0
+        while True:
+            try:
+                await public.load_markets()
+                break
+            except Exception as e:
+                print(f"Error loading {exchange_id} markets: {e}. Retrying...")
+                await asyncio.sleep(backoff_delay(attempt, base=2.0))
+                attempt += 1
+        for account in accounts.values():
+            if account.exchange_id == exchange_id:
+                account.exchange.set_markets(public.markets, public.currencies)
+
+    await asyncio.gather(
+        *(load(exchange_id, public) for exchange_id, public in market_data.items())
+    )
+    markets_ready.set()
+
+
+@on_shutdown
+async def close_exchanges():
+    clients = [a.exchange for a in accounts.values() if a.exchange is not None]
+    clients.extend(market_data.values())
+    await asyncio.gather(*(c.close() for c in clients), return_exceptions=True)
+    market_data.clear()
+
+
+# --- Resilience ---
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fails calls to one endpoint fast after repeated network errors.
+
+    Opens after `threshold` consecutive failures, lets a single trial call
+    through once `reset_seconds` have passed, and closes again when that call
+    succeeds. Also keeps a moving average of the endpoint's latency, which
+    sets how long a read waits before it is hedged.
+    """
+
+    def __init__(self, name: str, threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float = None
+        self.trial = False
+        self.latency: float = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self.trial and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.trial = True  # Half-open: one call decides
+            return True
+        return False
+
+    def record_success(self, latency: float):
+        if self.opened_at is not None:
+            print(f"Circuit for {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial or self.failures >= self.threshold:
+            if self.opened_at is None:
+                print(f"Circuit for {self.name} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self.trial = False
+
+
+class RetryBudget:
+    """Caps retries and hedged requests to a share of an exchange's traffic.
+
+    Every call earns `ratio` tokens and every retry or hedge spends one, plus
+    `min_per_second` tokens of allowance so a quiet client can still retry.
+    A degraded exchange therefore can't turn each call into several.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.5, cap: float = 10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.cap = cap
+        self.tokens = cap
+        self.updated = time.monotonic()
+
+    def _refill(self, amount: float = 0):
+        now = time.monotonic()
+        earned = (now - self.updated) * self.min_per_second + amount
+        self.tokens = min(self.cap, self.tokens + earned)
+        self.updated = now
+
+    def deposit(self):
+        self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+_breakers = weakref.WeakKeyDictionary()  # Exchange -> {method: breaker}
+_budgets = weakref.WeakKeyDictionary()  # Exchange -> budget
+
+
+def get_breaker(exchange: ccxt.Exchange, method: str) -> CircuitBreaker:
+    breakers = _breakers.setdefault(exchange, {})
+    if method not in breakers:
+        breakers[method] = CircuitBreaker(
+            f"{exchange.id}.{method}", BREAKER_THRESHOLD, BREAKER_RESET_SECONDS
+        )
+    return breakers[method]
+
+
+def get_budget(exchange: ccxt.Exchange) -> RetryBudget:
+    if exchange not in _budgets:
+        _budgets[exchange] = RetryBudget(RETRY_BUDGET_RATIO)
+    return _budgets[exchange]
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = MAX_BACKOFF) -> float:
+    """Exponential backoff with jitter over the upper half of the window."""
+    delay = min(cap, base * 2**attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def retry_delay(
+    exchange: ccxt.Exchange, error: Exception, attempt: int, base: float = 1.0
+) -> float:
+    """How long to wait before retrying after `error`.
+
+    Rate limit errors wait for the exchange's `Retry-After` header when it
+    sends one (up to `MAX_BACKOFF`, since the caller may hold an account
+    lock), and back off from at least the exchange's request interval.
+    """
+    if isinstance(error, (ccxt.RateLimitExceeded, ccxt.DDoSProtection)):
+        headers = exchange.last_response_headers or {}
+        for header, value in headers.items():
+            if header.lower() == "retry-after":
+                try:
+                    return min(float(value), MAX_BACKOFF)
+                except ValueError:
+                    break  # An HTTP date; fall back to backoff
+        base = max(base, exchange.rateLimit / 1000)
+    return backoff_delay(attempt, base)
+
+
+async def hedged_call(
+    call: Callable, breaker: CircuitBreaker, budget: RetryBudget
+):
+    """Runs `call`, starting a second copy if the first is slow.
+
+    The hedge starts after twice the endpoint's usual latency and the first
+    successful result wins. Only for reads that are safe to repeat.
+    """
+    first = asyncio.ensure_future(call())
+    delay = max(HEDGE_MIN_DELAY, 2 * (breaker.latency or 1.0))
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not budget.withdraw():
+        return await first
+
+    second = asyncio.ensure_future(call())
+    pending = {first, second}
+    try:
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+            if not pending:
+                return done.pop().result()  # Both failed
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_exchange(
+    exchange: ccxt.Exchange,
+    method: str,
+    *args,
+    idempotent: bool = False,
+    retries: int = MAX_RETRIES,
+    delay: float = 1.0,
+    **kwargs,
+):
+    """Calls `exchange.<method>(*args, **kwargs)` with retries and a breaker.
+
+    Network errors are retried up to `retries` attempts in total with
+    jittered backoff, while the exchange's retry budget allows. Idempotent
+    reads are also hedged. Writes are not retried after a timeout, since the
+    order may have gone through.
+    """
+    breaker = get_breaker(exchange, method)
+    budget = get_budget(exchange)
+    budget.deposit()
+
+    def call():
+        return getattr(exchange, method)(*args, **kwargs)
+
+    for attempt in range(retries):
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open")
+        started = time.monotonic()
+        try:
+            if idempotent:
+                result = await hedged_call(call, breaker, budget)
+            else:
+                result = await call()
+        except ccxt.NetworkError as e:
+            breaker.record_failure()
+            retryable = idempotent or not isinstance(e, ccxt.RequestTimeout)
+            if not retryable or attempt == retries - 1 or not budget.withdraw():
+                raise
+            wait = retry_delay(exchange, e, attempt, delay)
+            print(
+                f"Network error in {breaker.name}: {e}. "
+                f"Retry {attempt+1}/{retries - 1} in {wait:.1f}s"
+            )
+            await asyncio.sleep(wait)
+        except ccxt.ExchangeError:
+            # The endpoint answered; rejecting the request doesn't make it down
+            breaker.record_success(time.monotonic() - started)
+            raise
+        else:
+            breaker.record_success(time.monotonic() - started)
+            return result
+        finally:
+            breaker.trial = False  # Also when cancelled, or a half-open breaker stays shut
+
+
+# --- Analytics ---
+ANALYTICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pnl_state (
+    account TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    position REAL NOT NULL,
+    avg_price REAL NOT NULL,
+    mark_price REAL,
+    realized_pnl REAL NOT NULL,
+    unrealized_pnl REAL NOT NULL,
+    fees REAL NOT NULL,
+    trades INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    slippage_bps REAL NOT NULL,
+    fills INTEGER NOT NULL,
+    peak_equity REAL NOT NULL,
+    max_drawdown REAL NOT NULL,
+    updated INTEGER NOT NULL,
+    PRIMARY KEY (account, symbol)
+);
+CREATE TABLE IF NOT EXISTS pnl_rollups (
+    period TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    trades INTEGER NOT NULL,
+    volume REAL NOT NULL,
+    realized_pnl REAL NOT NULL,
+    fees REAL NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    slippage_bps REAL NOT NULL,
+    fills INTEGER NOT NULL,
+    PRIMARY KEY (period, bucket, account, symbol)
+);
+"""
+ROLLUP_PERIODS = {"minute": 60, "hour": 3600, "day": 86400}
+STATE_FIELDS = (
+    "position", "avg_price", "mark_price", "realized_pnl", "unrealized_pnl",
+    "fees", "trades", "wins", "losses", "slippage_bps", "fills",
+    "peak_equity", "max_drawdown", "updated",
 )
 
-if TEST_MODE:
-    if hasattr(exchange, "urls") and "test" in exchange.urls:
-        exchange.urls["api"] = exchange.urls["test"]
-    print(f"Currently TESTING on {EXCHANGE_ID}")
-else:
-    print(f"Currently LIVE on {EXCHANGE_ID}")
 
-exchange.load_markets()
+def new_pnl_state() -> Dict:
+    return {
+        "position": 0.0,  # Signed, positive for longs
+        "avg_price": 0.0,
+        "mark_price": None,
+        "realized_pnl": 0.0,
+        "unrealized_pnl": 0.0,
+        "fees": 0.0,
+        "trades": 0,
+        "wins": 0,
+        "losses": 0,
+        "slippage_bps": 0.0,  # Summed over `fills`; positive is worse
+        "fills": 0,
+        "peak_equity": 0.0,
+        "max_drawdown": 0.0,
+        "updated": 0,
+    }
 
-# --- Global State ---
-current_positions: Dict = {}
-last_prices: Dict = {}
+
+def apply_fill(state: Dict, side: str, amount: float, price: float, fee: float):
+    """Books a fill at average cost; returns the realized P&L it produced."""
+    signed = amount if side == "buy" else -amount
+    position = state["position"]
+    realized = 0.0
+    if position == 0 or (position > 0) == (signed > 0):
+        total = abs(position) + amount
+        state["avg_price"] = (state["avg_price"] * abs(position) + price * amount) / total
+    else:
+        closing = min(amount, abs(position))
+        realized = closing * (price - state["avg_price"]) * (1 if position > 0 else -1)
+        if amount > abs(position):
+            state["avg_price"] = price  # Flipped; the rest opens at this price
+        elif amount == abs(position):
+            state["avg_price"] = 0.0
+    state["position"] = position + signed
+    state["realized_pnl"] += realized
+    state["fees"] += fee
+    return realized
+
+
+def mark_to_market(state: Dict, price: float):
+    """Updates unrealized P&L and drawdown at the latest price."""
+    state["mark_price"] = price
+    state["unrealized_pnl"] = state["position"] * (price - state["avg_price"])
+    equity = state["realized_pnl"] + state["unrealized_pnl"] - state["fees"]
+    state["peak_equity"] = max(state["peak_equity"], equity)
+    state["max_drawdown"] = max(state["max_drawdown"], state["peak_equity"] - equity)
+
+
+class TradeAnalytics:
+    """Keeps running P&L per account and symbol off the trading path.
+
+    Logged trades and price marks are queued and applied by a background
+    thread, which keeps `pnl_state` (current figures) and `pnl_rollups`
+    (per minute/hour/day) in their own database, so dashboards never read
+    the live trading database.
+    """
+
+    def __init__(self, database: str):
+        self.database = database
+        self.events = queue.Queue()
+        self.states: Dict = {}  # (account, symbol) -> state
+        self.thread: threading.Thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.events.put(None)
+        self.thread.join()
+
+    def record_trade(self, trade: Dict):
+        self.events.put(("trade", trade))
+
+    def record_mark(self, account: str, symbol: str, price: float):
+        self.events.put(("mark", (account, symbol, price)))
+
+    def run(self):
+        # Local workers all write this file; wait for each other's locks
+        db = sqlite3.connect(self.database, timeout=30)
+        db.execute("PRAGMA journal_mode = WAL")  # Readers don't block the writer
+        db.executescript(ANALYTICS_SCHEMA)
+        db.row_factory = sqlite3.Row
+
+        changed = set()  # States not yet written
+        while True:
+            # Apply whatever has queued up in one transaction
+            events = [self.events.get()]
+            while not self.events.empty() and len(events) < 1000:
+                events.append(self.events.get_nowait())
+            stopping = None in events
+            for event in events:
+                if event is None:
+                    continue
+                try:
+                    kind, payload = event
+                    if kind == "trade":
+                        key = self.apply_trade(db, payload)
+                    else:
+                        key = self.apply_mark(db, *payload)
+                    if key:
+                        changed.add(key)
+                except Exception as e:
+                    handle_exception(e)
+            try:
+                for account, symbol in changed:
+                    state = self.states[(account, symbol)]
+                    db.execute(
+                        f"INSERT OR REPLACE INTO pnl_state (account, symbol, {', '.join(STATE_FIELDS)})"
+                        f" VALUES (?, ?, {', '.join('?' * len(STATE_FIELDS))})",
+                        (account, symbol, *(state[field] for field in STATE_FIELDS)),
+                    )
+                db.commit()
+                changed = set()
+            except sqlite3.Error as e:
+                # Keep going; the states are written again with the next batch
+                # (this batch's rollup increments are lost)
+                db.rollback()
+                handle_exception(e)
+            if stopping:
+                break
+        db.close()
+
+    def get_state(self, db: sqlite3.Connection, key, create: bool = True) -> Dict:
+        """Returns the state for `key`, resuming from the database if needed.
+
+        Loaded lazily: local scale-out workers share this database, and an
+        account may have been traded by another worker before. Remote workers
+        write to their own `ANALYTICS_DATABASE`.
+        """
+        if key not in self.states:
+            row = db.execute(
+                "SELECT * FROM pnl_state WHERE account = ? AND symbol = ?", key
+            ).fetchone()
+            if row is not None:
+                self.states[key] = {field: row[field] for field in STATE_FIELDS}
+            elif create:
+                self.states[key] = new_pnl_state()
+        return self.states.get(key)
+
+    def apply_trade(self, db: sqlite3.Connection, trade: Dict):
+        amount = trade.get("amount") or 0
+        if trade.get("status") != "placed" or amount <= 0 or not trade.get("side"):
+            return None
+        key = (trade["account"], trade["symbol"])
+        state = self.get_state(db, key)
+        price = trade.get("fill_price") or trade["price"]
+        fee = trade.get("fees") or 0
+        realized = apply_fill(state, trade["side"], amount, price, fee)
+        win = int(realized > 0)
+        loss = int(realized < 0)
+        slippage = 0.0
+        fills = 0
+        if trade.get("fill_price") and trade.get("signal_price"):
+            direction = 1 if trade["side"] == "buy" else -1
+            slippage = (
+                direction * (trade["fill_price"] - trade["signal_price"])
+                / trade["signal_price"] * 10000
+            )
+            fills = 1
+        state["trades"] += 1
+        state["wins"] += win
+        state["losses"] += loss
+        state["slippage_bps"] += slippage
+        state["fills"] += fills
+        state["updated"] = trade["timestamp"]
+        mark_to_market(state, price)
+
+        for period, seconds in ROLLUP_PERIODS.items():
+            db.execute(
+                "INSERT INTO pnl_rollups (period, bucket, account, symbol, trades,"
+                " volume, realized_pnl, fees, wins, losses, slippage_bps, fills)"
+                " VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (period, bucket, account, symbol) DO UPDATE SET"
+                " trades = trades + 1, volume = volume + excluded.volume,"
+                " realized_pnl = realized_pnl + excluded.realized_pnl,"
+                " fees = fees + excluded.fees, wins = wins + excluded.wins,"
+                " losses = losses + excluded.losses,"
+                " slippage_bps = slippage_bps + excluded.slippage_bps,"
+                " fills = fills + excluded.fills",
+                (
+                    period,
+                    trade["timestamp"] - trade["timestamp"] % seconds,
+                    *key,
+                    amount * price,
+                    realized,
+                    fee,
+                    win,
+                    loss,
+                    slippage,
+                    fills,
+                ),
+            )
+        return key
+
+    def apply_mark(self, db: sqlite3.Connection, account: str, symbol: str, price: float):
+        state = self.get_state(db, (account, symbol), create=False)
+        if state is None or (state["position"] == 0 and state["mark_price"] == price):
+            return None
+        mark_to_market(state, price)
+        state["updated"] = int(time.time())
+        return (account, symbol)
+
+
+def query_analytics(period: str = None, since: int = 0) -> Dict:
+    """Reads P&L figures from the analytics database, read-only."""
+    db = sqlite3.connect(f"file:{ANALYTICS_DATABASE}?mode=ro", uri=True)
+    db.row_factory = sqlite3.Row
+    try:
+        positions = [dict(row) for row in db.execute("SELECT * FROM pnl_state")]
+        for row in positions:
+            closed = row["wins"] + row["losses"]
+            row["win_rate"] = row["wins"] / closed if closed else None
+            row["avg_slippage_bps"] = (
+                row["slippage_bps"] / row["fills"] if row["fills"] else None
+            )
+        rollups = []
+        if period:
+            rollups = [
+                dict(row)
+                for row in db.execute(
+                    "SELECT * FROM pnl_rollups WHERE period = ? AND bucket >= ?"
+                    " ORDER BY bucket",
+                    (period, since),
+                )
+            ]
+        return {"positions": positions, "rollups": rollups}
+    finally:
+        db.close()
+
+
+analytics: TradeAnalytics = None
+
+
+@on_startup
+async def init_analytics():
+    global analytics
+    analytics = TradeAnalytics(ANALYTICS_DATABASE)
+    analytics.start()
+
+
+@on_shutdown
+async def stop_analytics():
+    if analytics is not None:
+        analytics.stop()
 
 
 # --- Helper Functions ---
 def log_trade(data: Dict):
+    data["timestamp"] = int(time.time())
     db = get_db()
     db.execute(
-        "INSERT INTO trades (timestamp, action, order_type, symbol, price, amount, fees, status)"
-        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        "INSERT INTO trades (timestamp, account, action, order_type, symbol, price, amount, fees, status)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
         (
-            int(time.time()),
+            data["timestamp"],
+            data.get("account"),
             data.get("action"),
             data.get("order_type"),
             data.get("symbol"),
@@ -110,6 +842,14 @@ def log_trade(data: Dict):
     )
     db.commit()
     db.close()
+    if analytics is not None:
+        analytics.record_trade(data)
+
+
+def order_fees(order: Dict) -> float:
+    """Total fee cost of an order, in the fee currency (usually the quote)."""
+    fees = order.get("fees") or ([order["fee"]] if order.get("fee") else [])
+    return sum(fee.get("cost") or 0 for fee in fees)
 
 
 def calculate_order_price(
@@ -126,24 +866,144 @@ def calculate_order_price(
 
 async def handle_limit_order_fill(
     exchange: ccxt.Exchange,
+    symbol: str,
     order_id: str,
     amount: float,
     limit_cancel_time_seconds: int,
 ):
     await asyncio.sleep(limit_cancel_time_seconds)
     try:
-        order : NoReturn = await await exchange.fetch_order(order_id, TICKER)
+        order : NoReturn = await call_exchange(
+            exchange, "fetch_order", order_id, symbol, idempotent=True
+        )
         if order["status"] != "closed":
-            exchange.cancel_order(order_id, TICKER)
+            await call_exchange(exchange, "cancel_order", order_id, symbol)
             return False, amount - order["filled"]
         return True, 0
-    except ccxt.NetworkError as e:
+    except (ccxt.NetworkError, CircuitOpenError) as e:
         print(f"Network error checking order: {e}")
         return False, amount
 
 
+def order_spec(
+    symbol: str,
+    order_type: str,
+    side: str,
+    amount: float,
+    price: float = None,
+    params: dict = None,
+    fixed_price: bool = False,
+) -> Dict:
+    """Describes an order in the form `exchange.create_orders` expects.
+
+    A limit order with `fixed_price` keeps its price instead of being moved
+    to the best bid/ask.
+    """
+    return {
+        "symbol": symbol,
+        "type": order_type,
+        "side": side,
+        "amount": amount,
+        "price": price,
+        "params": params or {},
+        "fixed_price": fixed_price,
+    }
+
+
+async def best_limit_price(
+    exchange: ccxt.Exchange, symbol: str, side: str, price: float
+) -> float:
+    order_book: NoReturn = await call_exchange(
+        exchange, "fetch_order_book", symbol, idempotent=True
+    )
+    if side == "buy":
+        best_bid = order_book["bids"][0][0] if order_book["bids"] else None
+        if best_bid and price <= best_bid:
+            price = best_bid
+    elif side == "sell":
+        best_ask = order_book["asks"][0][0] if order_book["asks"] else None
+        if best_ask and price >= best_ask:
+            price = best_ask
+    return price
+
+
+async def submit_orders(
+    exchange: ccxt.Exchange,
+    orders: List[Dict],
+    required: int = None,
+    retries: int = MAX_RETRIES,
+    delay: float = 1.0,
+) -> List:
+    """Sends orders in one batch request, or concurrently without a batch endpoint.
+
+    The first `required` orders (default: all) must succeed. Failures of the
+    remaining (protective) orders are returned as exceptions in their slots.
+    """
+    required = len(orders) if required is None else required
+    if exchange.has.get("createOrders"):
+        results = await call_exchange(
+            exchange, "create_orders", orders, retries=retries, delay=delay
+        )
+    else:
+        results = await asyncio.gather(
+            *(
+                call_exchange(
+                    exchange,
+                    "create_order",
+                    o["symbol"],
+                    o["type"],
+                    o["side"],
+                    o["amount"],
+                    o["price"],
+                    o["params"],
+                    retries=retries,
+                    delay=delay,
+                )
+                for o in orders
+            ),
+            return_exceptions=True,
+        )
+    # Batch endpoints report rejected items as orders without an id
+    results = [
+        ccxt.InvalidOrder(f"{o['type']} order rejected: {r.get('info', r)}")
+        if not isinstance(r, Exception)
+        and (not r.get("id") or r.get("status") == "rejected")
+        else r
+        for r, o in zip(results, orders)
+    ]
+    failed = [r for r in results[:required] if isinstance(r, Exception)]
+    if failed:
+        # Don't leave protective orders behind for a position we didn't get
+        await asyncio.gather(
+            *(
+                call_exchange(exchange, "cancel_order", r["id"], o["symbol"])
+                for r, o in zip(results, orders)
+                if not isinstance(r, Exception)
+            ),
+            return_exceptions=True,
+        )
+        raise failed[0]
+    return results
+
+
+async def place_orders_with_retries(
+    exchange: ccxt.Exchange,
+    orders: List[Dict],
+    required: int = None,
+    retries: int = 3,
+    delay: int = 2,
+) -> List:
+    for order in orders:
+        if order["type"] == "limit" and not order["fixed_price"]:
+            order["price"] = await best_limit_price(
+                exchange, order["symbol"], order["side"], order["price"]
+            )
+    return await submit_orders(exchange, orders, required, retries, delay)
+
+
 async def place_order_with_retries(
     exchange: ccxt.Exchange,
+    symbol: str,
     order_type: str,
     side: str,
     amount: float,
@@ -152,139 +1012,450 @@ async def place_order_with_retries(
     retries: int = 3,
     delay: int = 2,
 ):
-    for i in range(retries):
+    orders = [order_spec(symbol, order_type, side, amount, price, dict(params))]
+    return (await place_orders_with_retries(exchange, orders, None, retries, delay))[0]
+
+
+# --- Protective Orders ---
+def stop_order_params(account: Account, trigger_price: float, entry_price: float):
+    return {
+        "stopLoss": {
+            "triggerPriceType": TRAILING_STOP_TYPE,
+            "triggerPrice": trigger_price,
+            "pegOffsetValueRp": int(
+                TRAILING_STOP_PERCENT
+                * entry_price
+                * account.exchange.markets[account.symbol]["precision"]["price"]
+            ),  # Specify the trailing offset in raw price units
+        }
+    }
+
+
+def protective_prices(side: str, entry_price: float, take_profit_percent: float):
+    """Returns the initial stop and take-profit (or None) prices for an entry."""
+    if side == "buy":
+        stop_price = entry_price * (1 - TRAILING_STOP_PERCENT)
+        take_profit = take_profit_percent and entry_price * (1 + take_profit_percent)
+    else:
+        stop_price = entry_price * (1 + TRAILING_STOP_PERCENT)
+        take_profit = take_profit_percent and entry_price * (1 - take_profit_percent)
+    return stop_price, take_profit or None
+
+
+async def submit_entry(
+    account: Account,
+    side: str,
+    amount: float,
+    price: float,
+    order_type: str,
+    take_profit_percent: float = None,
+    protect: float = None,
+):
+    """Places an entry together with its stop (and take-profit).
+
+    Uses, in order of preference: an entry with the stop and take-profit
+    attached, one batch request for the entry and its protective orders, or
+    all of them sent concurrently. `protect` is the size of the position the
+    protective orders cover once the entry nets against the tracked one
+    (default `amount`); with 0 none are placed. Limit entries are only
+    bracketed when the exchange can attach the orders, since they may fill
+    partially.
+
+    Returns the entry order and the position fields for its protection.
+    """
+    exchange, symbol = account.exchange, account.symbol
+    stop_price, take_profit = protective_prices(side, price, take_profit_percent)
+    close_side = "sell" if side == "buy" else "buy"
+    if protect is None:
+        protect = amount
+
+    params = {}
+    protective = []
+    if (
+        protect
+        and exchange.has.get("createOrderWithTakeProfitAndStopLoss")
+        and exchange.has.get("fetchOpenOrders")  # To find them again later
+    ):
+        params["stopLoss"] = {"triggerPrice": stop_price}
+        if take_profit:
+            params["takeProfit"] = {"triggerPrice": take_profit}
+    elif protect and order_type == "market":
+        protective.append(
+            order_spec(
+                symbol,
+                "stop",
+                close_side,
+                protect,
+                None,
+                stop_order_params(account, stop_price, price),
+            )
+        )
+        if take_profit:
+            protective.append(
+                order_spec(
+                    symbol,
+                    "limit",
+                    close_side,
+                    protect,
+                    take_profit,
+                    {"reduceOnly": True},
+                    fixed_price=True,  # A take-profit doesn't chase the book
+                )
+            )
+
+    entry = order_spec(symbol, order_type, side, amount, price, params)
+    results = await place_orders_with_retries(exchange, [entry] + protective, 1)
+    order = results[0]
+
+    protection = {"trailing_stop": None}
+    if params:
+        # The exchange gives the attached orders no ids: they are looked up
+        # when cancelled, and the stop is trailed by exiting at market instead
+        protection["trailing_stop"] = stop_price
+        protection["attached_protection"] = True
+    for spec, result in zip(protective, results[1:]):
+        if isinstance(result, Exception):
+            print(f"Error placing protective {spec['type']} order: {result}")
+        elif spec["type"] == "stop":
+            protection["trailing_stop"] = stop_price
+            protection["trailing_stop_order_id"] = result["id"]
+        else:
+            protection["take_profit_order_id"] = result["id"]
+    return order, protection
+
+
+async def protective_orders(account: Account, position: Dict) -> List[tuple]:
+    """Returns `(order_id, params)` for a position's stop and take-profit.
+
+    Attached orders get no ids at entry, so they are looked up among the open
+    orders, plain and trigger ones: those on the closing side that can only
+    reduce the position.
+    """
+    if not position:
+        return []
+    orders = [
+        (position[key], {})
+        for key in ("trailing_stop_order_id", "take_profit_order_id")
+        if position.get(key)
+    ]
+    if position.get("attached_protection"):
+        close_side = "sell" if position["side"] == "long" else "buy"
+        seen = set()
+        for params in ({}, {"trigger": True}):
+            for order in await call_exchange(
+                account.exchange,
+                "fetch_open_orders",
+                account.symbol,
+                params=params,
+                idempotent=True,
+            ):
+                closing = order.get("reduceOnly") or any(
+                    order.get(key)
+                    for key in ("triggerPrice", "stopLossPrice", "takeProfitPrice")
+                )
+                if order["side"] == close_side and closing and order["id"] not in seen:
+                    seen.add(order["id"])
+                    orders.append((order["id"], params))
+    return orders
+
+
+async def cancel_orders(account: Account, orders: List[tuple]):
+    """Cancels `(order_id, params)` orders concurrently."""
+    results = await asyncio.gather(
+        *(
+            call_exchange(
+                account.exchange, "cancel_order", i, account.symbol, params=params
+            )
+            for i, params in orders
+        ),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error canceling protective order: {result}")
+
+
+async def cancel_protective_orders(account: Account, position: Dict):
+    """Cancels a position's stop and take-profit orders concurrently."""
+    await cancel_orders(account, await protective_orders(account, position))
+
+
+async def replacing_protection(account: Account, previous: Dict, orders):
+    """Awaits `orders`, then cancels `previous`'s protective orders.
+
+    If `orders` fail, the position keeps its protection. Attached orders are
+    looked up before `orders` go out, so the ones a new entry attaches are
+    not mistaken for them.
+    """
+    stale = await protective_orders(account, previous)
+    result = await orders
+    await cancel_orders(account, stale)
+    return result
+
+
+async def replace_trailing_stop(account: Account, position: Dict, side: str):
+    """Moves the exchange stop order to the position's new trailing stop."""
+    exchange, symbol = account.exchange, account.symbol
+    if position.get("attached_protection"):
+        return  # The attached stop stays as a backstop; manage_* exits at market
+
+    # Cancel existing trailing stop order (if any)
+    if "trailing_stop_order_id" in position:
         try:
-            if order_type == "limit":
-                order_book: NoReturn = await exchange.fetch_order_book(TICKER)
-                if side == "buy":
-                    best_bid = order_book["bids"][0][0] if order_book["bids"] else None
-                    if best_bid and price <= best_bid:
-                        price = best_bid
-                elif side == "sell":
-                    best_ask = order_book["asks"][0][0] if order_book["asks"] else None
-                    if best_ask and price >= best_ask:
-                        price = best_ask
-
-            order = await exchange.create_order(
-                TICKER, order_type, side, amount, price, params
+            await call_exchange(
+                exchange, "cancel_order", position["trailing_stop_order_id"], symbol
             )
-            return order
-        except ccxt.NetworkError as e:
-            print(f"Network error placing order: {e}. Retry {i+1}/{retries}")
-            if i < retries - 1:
-                await asyncio.sleep(delay * 2**i)
-    raise Exception("Failed to place order after retries")
+        except Exception as e:
+            print(f"Error canceling trailing stop order: {e}")
+
+    # Place new trailing stop order
+    try:
+        trailing_stop_order_params = stop_order_params(
+            account, position["trailing_stop"], position["entry_price"]
+        )
+        order = await call_exchange(
+            exchange,
+            "create_order",
+            symbol,
+            "stop",
+            side,
+            position["amount"],
+            params=trailing_stop_order_params,
+        )
+        position["trailing_stop_order_id"] = order[
+            "id"
+        ]  # Store the order ID for cancellation
+        print(f"Trailing stop order placed for {symbol} at {position['trailing_stop']}")
+    except Exception as e:
+        print(f"Error placing trailing stop order: {e}")
 
 
 # --- Trading Logic ---
+ENTRY_SIDES = {
+    "long_entry": "buy",
+    "short_entry": "sell",
+    "reverse_short_to_long": "buy",
+    "reverse_long_to_short": "sell",
+}
+EXIT_SIDES = {"long_exit": "long", "short_exit": "short"}
+
+
+def signed_amount(position: Dict) -> float:
+    """Position size, positive for longs and negative for shorts."""
+    if not position:
+        return 0
+    return position["amount"] if position["side"] == "long" else -position["amount"]
+
+
 async def execute_trade(json_data: Dict):
+    account = get_account(json_data.get("account"))
+    if account is None:
+        print(f"Unknown account: {json_data.get('account')}")
+        return f"Unknown account: {json_data.get('account')}", 400
+    exchange = account.exchange
     action = json_data.get("action")
-    symbol = TICKER
+    symbol = account.symbol
     order_type = json_data.get("order_type", "market")
     limit_backtrace_percent = json_data.get("limit_backtrace_percent")
     limit_cancel_time_seconds = int(json_data.get("limit_cancel_time_seconds", 0))
-
+    take_profit_percent = json_data.get("take_profit_percent", TAKE_PROFIT_PERCENT)
+    if take_profit_percent is not None:
+        take_profit_percent = float(take_profit_percent)
+    if action not in ENTRY_SIDES and action not in EXIT_SIDES:
+        print(f"Unknown action: {action}")
+        return f"Unknown action: {action}", 400
+
+    await markets_ready.wait()
     try:
-        ticker = await exchange.fetch_ticker(symbol)
+        ticker = await call_exchange(
+            market_data[account.exchange_id], "fetch_ticker", symbol, idempotent=True
+        )
         last_price = ticker["last"]
-        last_prices[TICKER] = last_price
+        last_prices[(account.exchange_id, symbol)] = last_price
     except Exception as e:
         print(f"Error fetching ticker data: {e}")
         return
 
+    signal_price = float(json_data.get("price") or last_price)
     order_price = calculate_order_price(action, last_price, limit_backtrace_percent)
 
-    try:
-        balance = await exchange.fetch_balance()
-        free_balance = (
-            balance[TICKER_QUOTE]["free"]
-            if "USDT" in TICKER
-            else balance[TICKER_BASE]["free"] * last_price
-        )
-        amount = (free_balance * LEVERAGE * 0.95) / last_price
-
-        if order_type == "limit":
-            order = await place_order_with_retries(
-                exchange,
-                "limit",
-                "buy" if action == "long_entry" else "sell",
-                amount,
-                order_price,
-            )
-            if limit_cancel_time_seconds > 0:
+    # Positions only change under the account lock, so the trailing stop
+    # logic never sees a half-flipped position.
+    async with account.lock:
+        if not owns(account):
+            # Handed to another worker while this signal was waiting
+            print(f"Account {account.name} is no longer managed here")
+            return f"Account {account.name} is no longer managed here", 409
+        previous = account.positions.get(symbol)
+        held = signed_amount(previous)
+        try:
+            if action in EXIT_SIDES:
+                if not previous or previous["side"] != EXIT_SIDES[action]:
+                    print(f"No {EXIT_SIDES[action]} position to exit for {symbol}")
+                    return "No position to exit", 200
+                if order_type == "limit" and limit_cancel_time_seconds <= 0:
+                    # Without a fill check the position would be dropped unfilled
+                    print("Limit exits need limit_cancel_time_seconds")
+                    return "Limit exits need limit_cancel_time_seconds", 400
+                side = "sell" if held > 0 else "buy"
+                executed = abs(held)
+                protection = {"trailing_stop": None}
+                stale = await protective_orders(account, previous)
+                order = await place_order_with_retries(
+                    exchange,
+                    symbol,
+                    order_type,
+                    side,
+                    executed,
+                    order_price,
+                    {"reduceOnly": True},
+                )
+            else:
+                side = ENTRY_SIDES[action]
+                balance = await call_exchange(exchange, "fetch_balance", idempotent=True)
+                free_balance = (
+                    balance[account.ticker_quote]["free"]
+                    if "USDT" in symbol
+                    else balance[account.ticker_base]["free"] * last_price
+                )
+                executed = (free_balance * account.leverage * 0.95) / last_price
+
+                # A reverse is one order for (existing + new): it closes the
+                # tracked position and opens the new one in a single fill.
+                if action.startswith("reverse_") and held and (held > 0) == (
+                    side == "sell"
+                ):
+                    # Closing releases the old position's margin
+                    executed += 2 * abs(held)
+
+                # Every entry nets against the tracked position, and the
+                # protective orders cover the result when it is on this side.
+                expected = held + (executed if side == "buy" else -executed)
+                protect = abs(expected) if (expected > 0) == (side == "buy") else 0
+                stale = await protective_orders(account, previous)
+                order, protection = await submit_entry(
+                    account,
+                    side,
+                    executed,
+                    order_price,
+                    order_type,
+                    take_profit_percent,
+                    protect,
+                )
+
+            if order_type == "limit" and limit_cancel_time_seconds > 0:
                 filled, remaining_amount = await handle_limit_order_fill(
-                    exchange, order["id"], amount, limit_cancel_time_seconds
+                    exchange, symbol, order["id"], executed, limit_cancel_time_seconds
                 )
                 if not filled:
                     print("Limit order did not fill in time, canceling order.")
-                    amount = remaining_amount
-        else:
-            order = await place_order_with_retries(
-                exchange,
-                "market",
-                "buy" if action == "long_entry" else "sell",
-                amount,
-                order_price,
-            )
-
-        if order:
-            current_positions[symbol] = {
-                "side": "long" if action == "long_entry" else "short",
-                "entry_price": order_price,
-                "amount": amount,
-                "trailing_stop": None,  # We'll set this dynamically later
-                "emergency_exit": order_price
-                * (
-                    1 - EMERGENCY_EXIT_PERCENT
-                    if action == "long_entry"
-                    else 1 + EMERGENCY_EXIT_PERCENT
-                ),
-            }
+                    executed -= remaining_amount
+                if not executed:
+                    return "Limit order did not fill", 200
+
+            # The old position keeps its stop and take-profit until the order
+            # has gone through (and, for limit orders, filled)
+            await cancel_orders(account, stale)
+
+            net = held + (executed if side == "buy" else -executed)
+            if protection.get("trailing_stop") and (net > 0) != (side == "buy"):
+                # A partial fill left the position on the other side
+                await cancel_protective_orders(
+                    account, {**protection, "side": "long" if side == "buy" else "short"}
+                )
+                protection = {"trailing_stop": None}
+            if abs(net) < 1e-12:
+                account.positions.pop(symbol, None)
+            else:
+                if held and (net > 0) == (held > 0):
+                    # Same side as before, grown or partly closed. Its old
+                    # protective orders are gone; without new ones
+                    # manage_position places a stop on the next tick.
+                    position = {
+                        k: v
+                        for k, v in previous.items()
+                        if k
+                        not in (
+                            "trailing_stop",
+                            "trailing_stop_order_id",
+                            "take_profit_order_id",
+                            "attached_protection",
+                        )
+                    }
+                    if abs(net) > abs(held):  # Average cost of the added amount
+                        position["entry_price"] = (
+                            abs(held) * previous["entry_price"] + executed * order_price
+                        ) / abs(net)
+                else:
+                    position = {
+                        "side": "long" if net > 0 else "short",
+                        "entry_price": order_price,
+                    }
+                position.update(
+                    amount=abs(net),
+                    emergency_exit=position["entry_price"]
+                    * (
+                        1 - EMERGENCY_EXIT_PERCENT
+                        if net > 0
+                        else 1 + EMERGENCY_EXIT_PERCENT
+                    ),
+                    **protection,  # Initial stop; trailed dynamically later
+                )
+                account.positions[symbol] = position
             print(
-                f"{action.upper()} order placed for {symbol} at {order_price}. Amount: {amount}"
+                f"{action.upper()} order placed for {symbol} ({account.name}) at {order_price}. Amount: {executed}"
             )
 
-        log_trade(
-            {
-                "action": action,
-                "order_type": order_type,
-                "symbol": symbol,
-                "price": order_price,
-                "amount": amount,
-                "fees": order["fees"] if order else "N/A",
-                "status": "placed"
-                if order
-                else f"error: {order.get('error', 'Order Failed')}",
-            }
-        )
-        return "Order placed", 200
+            log_trade(
+                {
+                    "account": account.name,
+                    "action": action,
+                    "order_type": order_type,
+                    "symbol": symbol,
+                    "price": order_price,
+                    "amount": executed,
+                    "side": side,
+                    "fill_price": order.get("average") if order else None,
+                    "signal_price": signal_price,
+                    "fees": order_fees(order) if order else "N/A",
+                    "status": "placed"
+                    if order
+                    else f"error: {order.get('error', 'Order Failed')}",
+                }
+            )
+            return "Order placed", 200
 
-    except Exception as e:
-        log_trade(
-            {
-                "action": action,
-                "order_type": order_type,
-                "symbol": symbol,
-                "price": order_price,
-                "amount": 0,
-                "fees": "N/A",
-                "status": f"error: {e}",
-            }
-        )
-        return f"Error placing order: {e}", 500
+        except Exception as e:
+            log_trade(
+                {
+                    "account": account.name,
+                    "action": action,
+                    "order_type": order_type,
+                    "symbol": symbol,
+                    "price": order_price,
+                    "amount": 0,
+                    "fees": "N/A",
+                    "status": f"error: {e}",
+                }
+            )
+            return f"Error placing order: {e}", 500
 
 
-async def manage_position(symbol: str, last_price: float):
-    if symbol in current_positions:
-        position = current_positions[symbol]
-        if position["side"] == "long":
-            await manage_long_position(symbol, last_price)
-        elif position["side"] == "short":
-            await manage_short_position(symbol, last_price)
+async def manage_position(account: Account, last_price: float):
+    if account.lock.locked():
+        return  # A signal is changing this position; check again next tick
+    async with account.lock:
+        if owns(account) and account.symbol in account.positions:
+            position = account.positions[account.symbol]
+            if position["side"] == "long":
+                await manage_long_position(account, last_price)
+            elif position["side"] == "short":
+                await manage_short_position(account, last_price)
 
 
-async def manage_long_position(symbol: str, last_price: float):
-    position = current_positions[symbol]
+async def manage_long_position(account: Account, last_price: float):
+    exchange, symbol = account.exchange, account.symbol
+    position = account.positions[symbol]
     # Dynamically adjust trailing stop
     if position["trailing_stop"] is None or last_price >= position["trailing_stop"]:
         new_trailing_stop = last_price * (1 - TRAILING_STOP_PERCENT)
@@ -295,70 +1466,49 @@ async def manage_long_position(symbol: str, last_price: float):
             position["trailing_stop"] = new_trailing_stop
             print(f"Trailing stop for {symbol} updated to: {position['trailing_stop']}")
 
-            # Cancel existing trailing stop order (if any)
-            if "trailing_stop_order_id" in position:
-                try:
-                    await exchange.cancel_order(
-                        position["trailing_stop_order_id"], symbol
-                    )
-                except Exception as e:
-                    print(f"Error canceling trailing stop order: {e}")
-
-            # Place new trailing stop order
-            try:
-                trailing_stop_order_params = {
-                    "stopLoss": {
-                        "triggerPriceType": TRAILING_STOP_TYPE,
-                        "triggerPrice": position["trailing_stop"],
-                        "pegOffsetValueRp": int(
-                            TRAILING_STOP_PERCENT
-                            * position["entry_price"]
-                            * exchange.markets[TICKER]["precision"]["price"]
-                        ),  # Specify the trailing offset in raw price units
-                    }
-                }
-                order = await exchange.create_order(
-                    symbol,
-                    "stop",
-                    "sell",
-                    position["amount"],
-                    params=trailing_stop_order_params,
-                )
-                position["trailing_stop_order_id"] = order[
-                    "id"
-                ]  # Store the order ID for cancellation
-                print(
-                    f"Trailing stop order placed for {symbol} at {position['trailing_stop']}"
-                )
-            except Exception as e:
-                print(f"Error placing trailing stop order: {e}")
+            await replace_trailing_stop(account, position, "sell")
     if (
         last_price <= position["trailing_stop"]
         or last_price <= position["emergency_exit"]
     ):
         print(f"Exiting long position for {symbol} at market price.")
         try:
-            order = await exchange.create_order(
-                symbol, "market", "sell", position["amount"], last_price
+            order = await replacing_protection(
+                account,
+                position,
+                call_exchange(
+                    exchange,
+                    "create_order",
+                    symbol,
+                    "market",
+                    "sell",
+                    position["amount"],
+                    last_price,
+                ),
             )
             log_trade(
                 {
+                    "account": account.name,
                     "action": "long_exit",
                     "order_type": "market",
                     "symbol": symbol,
                     "price": last_price,
                     "amount": position["amount"],
-                    "fees": order["fees"] if order else "N/A",
+                    "side": "sell",
+                    "fill_price": order.get("average") if order else None,
+                    "signal_price": last_price,
+                    "fees": order_fees(order) if order else "N/A",
                     "status": "placed" if order else "error: Order Failed",
                 }
             )
-            del current_positions[symbol]  # Remove position from tracking
+            del account.positions[symbol]  # Remove position from tracking
         except Exception as e:
             print(f"Error exiting long position: {e}")
 
 
-async def manage_short_position(symbol: str, last_price: float):
-    position = current_positions[symbol]
+async def manage_short_position(account: Account, last_price: float):
+    exchange, symbol = account.exchange, account.symbol
+    position = account.positions[symbol]
 
     # Dynamically adjust trailing stop
     if position["trailing_stop"] is None or last_price <= position["trailing_stop"]:
@@ -370,64 +1520,43 @@ async def manage_short_position(symbol: str, last_price: float):
             position["trailing_stop"] = new_trailing_stop
             print(f"Trailing stop for {symbol} updated to: {position['trailing_stop']}")
 
-            # Cancel existing trailing stop order (if any)
-            if "trailing_stop_order_id" in position:
-                try:
-                    await exchange.cancel_order(
-                        position["trailing_stop_order_id"], symbol
-                    )
-                except Exception as e:
-                    print(f"Error canceling trailing stop order: {e}")
-
-            # Place new trailing stop order
-            try:
-                trailing_stop_order_params = {
-                    "stopLoss": {
-                        "triggerPriceType": TRAILING_STOP_TYPE,
-                        "triggerPrice": position["trailing_stop"],
-                        "pegOffsetValueRp": int(
-                            TRAILING_STOP_PERCENT
-                            * position["entry_price"]
-                            * exchange.markets[TICKER]["precision"]["price"]
-                        ),  # Specify the trailing offset in raw price units
-                    }
-                }
-                order = await exchange.create_order(
-                    symbol,
-                    "stop",
-                    "buy",  # Buy to cover the short position
-                    position["amount"],
-                    params=trailing_stop_order_params,
-                )
-                position["trailing_stop_order_id"] = order[
-                    "id"
-                ]  # Store the order ID for cancellation
-                print(
-                    f"Trailing stop order placed for {symbol} at {position['trailing_stop']}"
-                )
-            except Exception as e:
-                print(f"Error placing trailing stop order: {e}")
+            # Buy to cover the short position
+            await replace_trailing_stop(account, position, "buy")
     if (
         last_price >= position["trailing_stop"]
         or last_price >= position["emergency_exit"]
     ):
         print(f"Exiting short position for {symbol} at market price.")
         try:
-            order = await exchange.create_order(
-                symbol, "market", "buy", position["amount"], last_price
+            order = await replacing_protection(
+                account,
+                position,
+                call_exchange(
+                    exchange,
+                    "create_order",
+                    symbol,
+                    "market",
+                    "buy",
+                    position["amount"],
+                    last_price,
+                ),
             )
             log_trade(
                 {
+                    "account": account.name,
                     "action": "short_exit",
                     "order_type": "market",
                     "symbol": symbol,
                     "price": last_price,
                     "amount": position["amount"],
-                    "fees": order["fees"] if order else "N/A",
+                    "side": "buy",
+                    "fill_price": order.get("average") if order else None,
+                    "signal_price": last_price,
+                    "fees": order_fees(order) if order else "N/A",
                     "status": "placed" if order else "error: Order Failed",
                 }
             )
-            del current_positions[symbol]  # Remove position from tracking
+            del account.positions[symbol]  # Remove position from tracking
         except Exception as e:
             print(f"Error exiting short position: {e}")
 
@@ -442,8 +1571,8 @@ async def fetch_ohlcv_data(
 ) -> pd.DataFrame:
     """Fetches OHLCV data and returns it as a pandas DataFrame."""
     if isinstance(since, str):
-        since = exchange.parse8601(since) or
-    ohlcv = scrape_ohlcv(exchange, symbol, timeframe, since, limit)
+        since = exchange.parse8601(since) or 0
+    ohlcv = await scrape_ohlcv(exchange, symbol, timeframe, since, limit)
     df = pd.DataFrame(
         ohlcv, columns=["timestamp", "open", "high", "low", "close", "volume"]
     )
@@ -689,21 +1818,20 @@ async def fetch_tickers_concurrent(
 
 
 # --- Utility Functions ---
-def retry_fetch_ohlcv(
+async def retry_fetch_ohlcv(
     exchange: ccxt.Exchange, symbol: str, timeframe: str, since: int, limit: int
 ) -> List:
     """Retries fetching OHLCV data with a given number of attempts."""
-    for _ in range(MAX_RETRIES):
-        try:
-            return exchange.fetch_ohlcv(symbol, timeframe, since, limit)
-        except Exception as e:
-            print(f"Error fetching OHLCV data: {e}. Retrying...")
-            time.sleep(1)  # Wait before retrying
-    print(f"Failed to fetch OHLCV data after {MAX_RETRIES} attempts.")
-    return None  # Or raise an exception if you prefer
+    try:
+        return await call_exchange(
+            exchange, "fetch_ohlcv", symbol, timeframe, since, limit, idempotent=True
+        )
+    except (ccxt.NetworkError, CircuitOpenError) as e:
+        print(f"Failed to fetch OHLCV data after {MAX_RETRIES} attempts: {e}")
+        return None  # Or raise an exception if you prefer
 
 
-def scrape_ohlcv(
+async def scrape_ohlcv(
     exchange: ccxt.Exchange, symbol: str, timeframe: str, since: int, limit: int
 ) -> List:
     """Scrapes OHLCV data from the exchange."""
@@ -713,12 +1841,12 @@ def scrape_ohlcv(
     all_ohlcv = []
     fetch_since = since
     while fetch_since < now:
-        ohlcv = retry_fetch_ohlcv(exchange, symbol, timeframe, fetch_since, limit)
-        if ohlcv:
-            fetch_since = (
-                (ohlcv[-1][0] + 1) if len(ohlcv) else (fetch_since + timedelta)
-            )
-            all_ohlcv.extend(ohlcv)
+        ohlcv = await retry_fetch_ohlcv(exchange, symbol, timeframe, fetch_since, limit)
+        if ohlcv is None:
+            break  # Give up rather than spin on a failing exchange
+        fetch_since = (ohlcv[-1][0] + 1) if len(ohlcv) else (fetch_since + timedelta)
+        all_ohlcv.extend(ohlcv)
+        if all_ohlcv:
             print(
                 f"{len(all_ohlcv)} candles in total from {exchange.iso8601(all_ohlcv[0][0])} to {exchange.iso8601(all_ohlcv[-1][0])}"
             )
@@ -780,11 +1908,36 @@ def print_usage():
 
 
 # --- Webhook Route ---
-@app.route("/hook", methods=["POST"])
-async def webhook_handler():
-    json_data = request.get_json()
-    await handle_trade_signal(json_data)
-    return jsonify({"status": "ok"}), 200
+def create_app(dispatch: Callable[[Dict], None]):
+    """Builds the Flask app; each signal is handed to `dispatch`."""
+    from flask import Flask, jsonify, request
+
+    app = Flask(__name__)
+
+    @app.route("/hook", methods=["POST"])
+    def webhook_handler():
+        json_data = request.get_json()
+        dispatch(json_data)
+        return jsonify({"status": "ok"}), 200
+
+    @app.route("/analytics", methods=["GET"])
+    def analytics_handler():
+        if request.args.get("auth_id") != AUTH_ID:
+            return jsonify({"error": "unauthorized"}), 403
+        period = request.args.get("period")
+        if period is not None and period not in ROLLUP_PERIODS:
+            return jsonify({"error": f"period must be one of {list(ROLLUP_PERIODS)}"}), 400
+        try:
+            since = int(request.args.get("since", 0))
+        except ValueError:
+            return jsonify({"error": "since must be a Unix timestamp in seconds"}), 400
+        try:
+            data = query_analytics(period, since)
+        except sqlite3.OperationalError:
+            data = {"positions": [], "rollups": []}  # Nothing recorded yet
+        return jsonify(data), 200
+
+    return app
 
 
 async def handle_trade_signal(json_data: Dict):
@@ -793,30 +1946,387 @@ async def handle_trade_signal(json_data: Dict):
 
 
 # --- Main Loop ---
+async def poll_market(exchange_id: str, symbol: str, group: List[Account]):
+    """Fetches one ticker and manages every account trading that market."""
+    ticker = await call_exchange(
+        market_data[exchange_id], "fetch_ticker", symbol, idempotent=True
+    )
+    last_price = ticker["last"]
+    last_prices[(exchange_id, symbol)] = last_price
+    for account in group:
+        analytics.record_mark(account.name, symbol, last_price)
+    await asyncio.gather(*(manage_position(account, last_price) for account in group))
+
+
 async def main_loop():
-    while True:
+    await markets_ready.wait()
+    # Each market is polled by its own task, so a slow or failing one backs
+    # off on its own while the others keep their one-second ticks.
+    polls: Dict = {}  # Market -> poll in progress
+    backoff: Dict = {}  # Market -> (consecutive failures, when to poll next)
+    try:
+        while True:
+            try:
+                # One ticker request per market, however many accounts trade it
+                markets: Dict = {}
+                for account in accounts.values():
+                    if owns(account):
+                        key = (account.exchange_id, account.symbol)
+                        markets.setdefault(key, []).append(account)
+                now = time.monotonic()
+                for key, group in markets.items():
+                    if key not in polls and backoff.get(key, (0, now))[1] <= now:
+                        polls[key] = asyncio.ensure_future(poll_market(*key, group))
+            except Exception as e:
+                print(f"Error fetching ticker data: {e}")
+
+            await asyncio.sleep(1)  # Adjust as needed
+            for key, poll in list(polls.items()):
+                if not poll.done():
+                    continue
+                del polls[key]
+                if poll.exception():
+                    print(f"Error fetching ticker data for {key}: {poll.exception()}")
+                    errors = backoff.get(key, (0, 0))[0] + 1
+                    backoff[key] = (errors, time.monotonic() + backoff_delay(errors))
+                else:
+                    backoff.pop(key, None)
+    finally:
+        for poll in polls.values():
+            poll.cancel()
+
+
+# --- Scale-out ---
+owned_accounts: set = None  # None: this process manages every account
+
+
+def owns(account: Account) -> bool:
+    return owned_accounts is None or account.name in owned_accounts
+
+
+def shard_key(account: Account) -> str:
+    return f"{account.name}:{account.symbol}"
+
+
+class HashRing:
+    """Consistent hash ring mapping shard keys to worker names."""
+
+    def __init__(self, nodes: List[str] = (), replicas: int = 64):
+        self.replicas = replicas
+        self._hashes: List[int] = []
+        self._nodes: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def add(self, node: str):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            self._nodes[h] = node
+            bisect.insort(self._hashes, h)
+
+    def remove(self, node: str):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            del self._nodes[h]
+            del self._hashes[bisect.bisect_left(self._hashes, h)]
+
+    def get(self, key: str) -> str:
+        if not self._hashes:
+            return None
+        i = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._nodes[self._hashes[i]]
+
+
+class WorkerHandle:
+    """The ingress side of a connection to one worker."""
+
+    def __init__(self, name: str, conn, process=None):
+        self.name = name
+        self.conn = conn
+        self.process = process
+        self.lock = threading.Lock()
+
+    def send(self, message: Dict):
+        with self.lock:
+            self.conn.send(message)
+
+    def request(self, message: Dict, timeout: float) -> Dict:
+        with self.lock:
+            self.conn.send(message)
+            if not self.conn.poll(timeout):
+                raise TimeoutError(f"Worker {self.name} did not answer")
+            return self.conn.recv()
+
+    def drop(self, timeout: float) -> bool:
+        """Tells the worker to stop trading, waits for it to confirm and
+        closes the connection, which stops the worker if it didn't answer."""
         try:
-            ticker = await exchange.fetch_ticker(TICKER)
-            last_price = ticker["last"]
-            last_prices[TICKER] = last_price
+            with self.lock:
+                self.conn.send({"type": "drop"})
+                deadline = time.monotonic() + timeout
+                # Skip late answers to earlier pings
+                while self.conn.poll(max(0, deadline - time.monotonic())):
+                    if self.conn.recv().get("type") == "dropped":
+                        return True
+        except (OSError, EOFError):
+            pass
+        finally:
+            self.conn.close()
+        return False
+
+
+class Ingress:
+    """Accepts signals and forwards them to the worker owning the account.
+
+    Accounts are spread over workers with a consistent hash ring, so a worker
+    dying only moves its own accounts. Health checks keep the last position
+    snapshot of every account, which is handed to the account's new owner.
+    """
+
+    def __init__(self, workers: List[WorkerHandle]):
+        self.accounts = load_accounts()
+        self.workers = {worker.name: worker for worker in workers}
+        self.ring = HashRing(list(self.workers))
+        self.owners: Dict[str, str] = {}  # Account name -> worker name
+        self.snapshots: Dict[str, Dict] = {}  # Account name -> positions
+        self.draining: Dict[str, List] = {}  # Worker being dropped -> held signals
+        self.lock = threading.RLock()
+
+    def rebalance(self):
+        with self.lock:
+            owners = {
+                name: self.ring.get(shard_key(account))
+                for name, account in self.accounts.items()
+            }
+            for worker in list(self.workers.values()):
+                owned = [name for name, owner in owners.items() if owner == worker.name]
+                moved = {
+                    name: self.snapshots[name]
+                    for name in owned
+                    if self.owners.get(name) != worker.name and name in self.snapshots
+                }
+                try:
+                    worker.send({"type": "assign", "accounts": owned, "positions": moved})
+                except (OSError, EOFError):
+                    self.remove_worker(worker.name)
+                    return
+            self.owners = owners
+            print(f"Account assignments: {owners}")
+
+    def remove_worker(self, name: str):
+        with self.lock:
+            worker = self.workers.pop(name, None)
+            if worker is None:
+                return
+            print(f"Worker {name} is down, rebalancing")
+            self.ring.remove(name)
+            self.draining[name] = []
+        # Make sure a worker that was only slow stops trading its accounts
+        # before anyone else takes them over. This happens outside the lock,
+        # so only signals for this worker's accounts wait for it.
+        if not worker.drop(HEALTH_CHECK_SECONDS):
+            print(f"Worker {name} did not confirm the drop")
+        if worker.process is not None:
+            worker.process.terminate()
+        with self.lock:
+            self.rebalance()
+            for json_data in self.draining.pop(name):
+                self.dispatch(json_data)
+
+    def dispatch(self, json_data: Dict):
+        if json_data.get("auth_id") != AUTH_ID:
+            return
+        name = json_data.get("account") or next(iter(self.accounts))
+        account = self.accounts.get(name)
+        if account is None:
+            print(f"Unknown account: {name}")
+            return
+        while True:
+            with self.lock:
+                owner = self.owners.get(name)
+                if owner in self.draining:
+                    self.draining[owner].append(json_data)  # Sent after rebalancing
+                    return
+                worker = self.workers.get(self.ring.get(shard_key(account)))
+            if worker is None:
+                print(f"No worker available for {name}, dropping signal")
+                return
+            try:
+                worker.send({"type": "signal", "data": json_data})
+                return
+            except (OSError, EOFError):
+                self.remove_worker(worker.name)
 
-            await manage_position(TICKER, last_price)
+    def health_check(self):
+        for worker in list(self.workers.values()):
+            try:
+                if worker.process is not None and not worker.process.is_alive():
+                    raise EOFError
+                reply = worker.request({"type": "ping"}, HEALTH_CHECK_SECONDS)
+                self.snapshots.update(reply["positions"])
+            except (OSError, EOFError, TimeoutError):
+                self.remove_worker(worker.name)
 
-            await asyncio.sleep(1)  # Adjust as needed
-        except Exception as e:
-            print(f"Error fetching ticker data: {e}")
+    def health_loop(self):
+        while True:
+            time.sleep(HEALTH_CHECK_SECONDS)
+            self.health_check()
+
+
+signal_tasks: set = set()  # Signals this worker is still handling
+
+
+async def handle_worker_message(message: Dict) -> Dict:
+    global owned_accounts
+    kind = message.get("type")
+    if kind == "signal":
+        task = asyncio.current_task()
+        signal_tasks.add(task)
+        try:
+            await handle_trade_signal(message["data"])
+        finally:
+            signal_tasks.discard(task)
+    elif kind == "assign":
+        for name, positions in message["positions"].items():
+            if name in accounts and not accounts[name].positions:
+                accounts[name].positions = positions
+        owned_accounts = set(message["accounts"])
+        print(f"Managing accounts: {sorted(owned_accounts)}")
+    elif kind == "drop":
+        owned_accounts = set()
+        for account in accounts.values():
+            async with account.lock:
+                pass  # Let a signal or tick already in progress finish
+        # The rest haven't reached an account lock; once there, they would
+        # only find the account is no longer owned
+        for task in signal_tasks:
+            task.cancel()
+        await asyncio.gather(*signal_tasks, return_exceptions=True)
+        return {"type": "dropped"}
+    elif kind == "ping":
+        return {
+            "type": "pong",
+            "positions": {
+                a.name: copy.deepcopy(a.positions)
+                for a in accounts.values()
+                if owns(a)
+            },
+        }
+
+
+def serve_ingress(conn, loop: asyncio.AbstractEventLoop):
+    """Reads messages from the ingress until the connection closes."""
+    try:
+        while True:
+            message = conn.recv()
+            future = asyncio.run_coroutine_threadsafe(
+                handle_worker_message(message), loop
+            )
+            if message.get("type") in ("ping", "drop"):
+                conn.send(future.result())
+            if message.get("type") == "drop":
+                print("Dropped by the ingress, stopping worker")
+                break
+    except (OSError, EOFError):
+        print("Ingress connection closed, stopping worker")
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def run_worker(conn):
+    """Runs a worker that trades the accounts the ingress assigns to it."""
+    global owned_accounts
+    load_settings()
+    owned_accounts = set()  # Nothing until the ingress assigns accounts
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(startup())
+    threading.Thread(target=serve_ingress, args=(conn, loop), daemon=True).start()
+    run_forever(loop)
+
+
+def run_worker_server(address: str):
+    """Runs a worker that waits for the ingress on `host:port`."""
+    from multiprocessing.connection import Listener
+
+    load_settings()
+    host, port = address.rsplit(":", 1)
+    with Listener((host, int(port)), authkey=AUTH_ID.encode()) as listener:
+        print(f"Worker listening on {address}")
+        conn = listener.accept()
+    run_worker(conn)
+
+
+def start_workers() -> List[WorkerHandle]:
+    """Spawns `WORKERS` local workers and connects to `WORKER_ADDRESSES`."""
+    import multiprocessing
+    from multiprocessing.connection import Client
+
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for i in range(WORKERS):
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=run_worker, args=(child_conn,), daemon=True)
+        process.start()
+        workers.append(WorkerHandle(f"local-{i}", parent_conn, process))
+    for address in WORKER_ADDRESSES:
+        host, port = address.rsplit(":", 1)
+        conn = Client((host, int(port)), authkey=AUTH_ID.encode())
+        workers.append(WorkerHandle(address, conn))
+    return workers
 
 
 # --- Main ---
-if __name__ == "__main__":
-    # Start the Flask app in a separate thread
+def run_forever(loop: asyncio.AbstractEventLoop):
+    loop.create_task(main_loop())
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(shutdown())
+        loop.close()
+
+
+def run_ingress():
+    ingress = Ingress(start_workers())
+    ingress.rebalance()
+    threading.Thread(target=ingress.health_loop, daemon=True).start()
+    create_app(ingress.dispatch).run(port=int(os.getenv("PORT", 8080)))
+
+
+def main():
+    load_settings()
+    if len(sys.argv) == 3 and sys.argv[1] == "worker":
+        run_worker_server(sys.argv[2])
+        return
+    if WORKERS or WORKER_ADDRESSES:
+        run_ingress()
+        return
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    # Start the Flask app in a separate thread; it can accept signals right
+    # away, trades wait on `markets_ready` until the exchange is loaded.
+    app = create_app(
+        lambda json_data: asyncio.run_coroutine_threadsafe(
+            handle_trade_signal(json_data), loop
+        )
+    )
     flask_thread = threading.Thread(
-        target=app.run, kwargs={"debug": True, "port": int(os.getenv("PORT", 8080))}
+        target=app.run, kwargs={"port": int(os.getenv("PORT", 8080))}
     )
     flask_thread.daemon = True
     flask_thread.start()
 
     # Run the main trading loop using asyncio
-    loop = asyncio.get_event_loop()
-    loop.create_task(main_loop())
-    loop.run_forever()
+    loop.run_until_complete(startup())
+    run_forever(loop)
+
+
+if __name__ == "__main__":
+    main()